@@ -59,7 +59,7 @@ BuildRequires:    python-boto
 BuildRequires:    python-argparse
 BuildRequires:    python-jinja2
 %if 0%{?suse_version}
-BuildRequires:    python-M2Crypto
+BuildRequires:    python-cryptography
 BuildRequires:    python-Genshi
 BuildRequires:    python-gamin
 BuildRequires:    python-pyinotify
@@ -82,7 +82,7 @@ BuildRequires:    python-ssl
 # EL5 lacks python-mock, so test suite is disabled
 BuildRequires:    python-nose
 BuildRequires:    mock
-BuildRequires:    m2crypto
+BuildRequires:    python-cryptography
 # EPEL uses the properly-named python-django starting with EPEL7
 %if 0%{?rhel} && 0%{?rhel} > 6
 BuildRequires:    python-django >= 1.3
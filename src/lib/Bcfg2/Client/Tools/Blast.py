@@ -1,6 +1,6 @@
 """This provides Bcfg2 support for Blastwave."""
 
-import tempfile
+import sys
 import Bcfg2.Client.Tools.SYSV
 
 
@@ -16,12 +16,13 @@ class Blast(Bcfg2.Client.Tools.SYSV.SYSV):
     def __init__(self, config):
         # dont use the sysv constructor
         Bcfg2.Client.Tools.PkgTool.__init__(self, config)
-        noaskfile = tempfile.NamedTemporaryFile()
-        self.noaskname = noaskfile.name
         try:
-            noaskfile.write(Bcfg2.Client.Tools.SYSV.noask)
-        except:
-            pass
+            self.noaskname = Bcfg2.Client.Tools.SYSV.get_noask_file()
+        except (IOError, OSError):
+            err = sys.exc_info()[1]
+            self.logger.error("Blast: Could not write pkgrm admin file: %s" %
+                              err)
+            raise Bcfg2.Client.Tools.ToolInstantiationError(err)
 
     # VerifyPackage comes from Bcfg2.Client.Tools.SYSV
     # Install comes from Bcfg2.Client.Tools.PkgTool
@@ -1,7 +1,7 @@
 # This is the bcfg2 support for opencsw packages (pkgutil)
 """This provides Bcfg2 support for OpenCSW packages."""
 
-import tempfile
+import sys
 import Bcfg2.Client.Tools.SYSV
 
 
@@ -17,12 +17,13 @@ class OpenCSW(Bcfg2.Client.Tools.SYSV.SYSV):
     def __init__(self, config):
         # dont use the sysv constructor
         Bcfg2.Client.Tools.PkgTool.__init__(self, config)
-        noaskfile = tempfile.NamedTemporaryFile()
-        self.noaskname = noaskfile.name
         try:
-            noaskfile.write(Bcfg2.Client.Tools.SYSV.noask)
-        except:
-            pass
+            self.noaskname = Bcfg2.Client.Tools.SYSV.get_noask_file()
+        except (IOError, OSError):
+            err = sys.exc_info()[1]
+            self.logger.error("OpenCSW: Could not write pkgrm admin file: %s"
+                              % err)
+            raise Bcfg2.Client.Tools.ToolInstantiationError(err)
 
     # VerifyPackage comes from Bcfg2.Client.Tools.SYSV
     # Install comes from Bcfg2.Client.Tools.PkgTool
@@ -1,5 +1,8 @@
 """This provides bcfg2 support for Solaris SYSV packages."""
 
+import os
+import sys
+import atexit
 import tempfile
 from Bcfg2.Compat import any  # pylint: disable=W0622
 import Bcfg2.Client.Tools
@@ -23,6 +26,35 @@ basedir=default
 '''
 # pylint: enable=C0103
 
+#: The path to a temporary file containing :data:`noask`, shared by
+#: all tools that need one.  See :func:`get_noask_file`.
+_NOASK_PATH = None
+
+
+def get_noask_file():
+    """ Get the path to a temporary pkgadd/pkgrm admin file with the
+    contents of :data:`noask`.  The file is created the first time
+    this is called, and removed when the process exits.
+
+    :returns: string
+    :raises: IOError, OSError
+    """
+    global _NOASK_PATH  # pylint: disable=W0603
+    if _NOASK_PATH is None:
+        (fd, path) = tempfile.mkstemp()
+        try:
+            noaskfile = os.fdopen(fd, 'w')
+            try:
+                noaskfile.write(noask)
+            finally:
+                noaskfile.close()
+        except (IOError, OSError):
+            os.unlink(path)
+            raise
+        atexit.register(os.unlink, path)
+        _NOASK_PATH = path
+    return _NOASK_PATH
+
 
 class SYSV(Bcfg2.Client.Tools.PkgTool):
     """Solaris SYSV package support."""
@@ -36,19 +68,17 @@ class SYSV(Bcfg2.Client.Tools.PkgTool):
 
     def __init__(self, config):
         Bcfg2.Client.Tools.PkgTool.__init__(self, config)
-        # noaskfile needs to live beyond __init__ otherwise file is removed
-        self.noaskfile = tempfile.NamedTemporaryFile()
-        self.noaskname = self.noaskfile.name
         # for any pkg files downloaded
         self.tmpfiles = []
         try:
-            self.noaskfile.write(noask)
-            # flush admin file contents to disk
-            self.noaskfile.flush()
-            self.pkgtool = (self.pkgtool[0] % ("-a %s" % (self.noaskname)),
-                            self.pkgtool[1])
-        except:  # pylint: disable=W0702
-            self.pkgtool = (self.pkgtool[0] % "", self.pkgtool[1])
+            self.noaskname = get_noask_file()
+        except (IOError, OSError):
+            err = sys.exc_info()[1]
+            self.logger.error("SYSV: Could not write pkgadd admin file: %s" %
+                              err)
+            raise Bcfg2.Client.Tools.ToolInstantiationError(err)
+        self.pkgtool = (self.pkgtool[0] % ("-a %s" % (self.noaskname)),
+                        self.pkgtool[1])
         self.origpkgtool = self.pkgtool
 
     def pkgmogrify(self, packages):
@@ -4,6 +4,7 @@ The base for all server -> collector Transports
 
 import os
 import sys
+import errno
 import Bcfg2.Options
 from Bcfg2.Logger import Debuggable
 
@@ -25,13 +26,14 @@ class TransportBase(Debuggable):
         self.debug_log("Loading %s transport" % clsname)
         self.data = os.path.join(Bcfg2.Options.setup.repository, 'Reporting',
                                  clsname)
-        if not os.path.exists(self.data):
-            self.logger.info("%s does not exist, creating" % self.data)
-            try:
-                os.makedirs(self.data)
-            except OSError:
+        try:
+            os.makedirs(self.data)
+            self.logger.info("%s did not exist, created" % self.data)
+        except OSError:
+            err = sys.exc_info()[1]
+            if err.errno != errno.EEXIST:
                 self.logger.warning("Could not create %s: %s" %
-                                    (self.data, sys.exc_info()[1]))
+                                    (self.data, err))
                 self.logger.warning("The transport may not function properly")
         self.timeout = 2
 
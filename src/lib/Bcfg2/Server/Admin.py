@@ -708,21 +708,46 @@ class Minestruct(_ServerAdminCmd):
         try:
             extra = set()
             for source in self.core.plugins_by_type(PullSource):
-                for item in source.GetExtra(setup.hostname):
-                    extra.add(item)
+                extra.update(source.GetExtra(setup.hostname))
         except:  # pylint: disable=W0702
             self.errExit("Failed to find extra entry info for client %s: %s" %
                          (setup.hostname, sys.exc_info()[1]))
-        root = lxml.etree.Element("Base")
         self.logger.info("Found %d extra entries" % len(extra))
-        add_point = root
-        for grp in setup.groups:
-            add_point = lxml.etree.SubElement(add_point, "Group", name=grp)
-        for tag, name in extra:
-            self.logger.info("%s: %s" % (tag, name))
-            lxml.etree.SubElement(add_point, tag, name=name)
-
-        lxml.etree.ElementTree(root).write(setup.outfile, pretty_print=True)
+        # xmlfile needs a binary file; on python 3, argparse and
+        # sys.stdout give us text files, so use the underlying buffer
+        outfile = getattr(setup.outfile, 'buffer', setup.outfile)
+        with lxml.etree.xmlfile(outfile) as xfile:
+            self._write_entries(xfile, "Base", dict(), setup.groups, extra)
+        outfile.write("\n".encode("UTF-8"))
+        outfile.flush()
+
+    def _write_entries(self, xfile, tag, attrs, groups, extra, depth=0):
+        """ Incrementally write an element to the given
+        :class:`lxml.etree.xmlfile` writer, nesting a ``Group``
+        element below it for each of the given groups after the first
+        ``depth`` and writing the extra entries in the innermost one.
+        Only the element currently being written is kept in memory. """
+        if depth >= len(groups) and not extra:
+            # write an empty element as a self-closing tag
+            xfile.write(lxml.etree.Element(tag, attrs))
+            return
+        indent = "\n" + "  " * (depth + 1)
+        with xfile.element(tag, attrs):
+            if depth < len(groups):
+                xfile.write(indent)
+                self._write_entries(xfile, "Group", dict(name=groups[depth]),
+                                    groups, extra, depth=depth + 1)
+            else:
+                # extra entries share only a handful of distinct tags,
+                # so parse each tag name into a QName only once
+                qnames = dict()
+                for etag, name in extra:
+                    self.logger.info("%s: %s" % (etag, name))
+                    if etag not in qnames:
+                        qnames[etag] = lxml.etree.QName(etag)
+                    xfile.write(indent)
+                    xfile.write(lxml.etree.Element(qnames[etag], name=name))
+            xfile.write("\n" + "  " * depth)
 
 
 class Perf(_ProxyAdminCmd):
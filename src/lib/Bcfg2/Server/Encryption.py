@@ -3,26 +3,54 @@ for handling encryption in Bcfg2.  See :ref:`server-encryption` for
 more details. """
 
 import os
+import binascii
 import sys
 import copy
 import logging
 import lxml.etree
 import Bcfg2.Logger
 import Bcfg2.Options
-from M2Crypto import Rand
-from M2Crypto.EVP import Cipher, EVPError
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.padding import PKCS7
+try:
+    # newer versions of cryptography move legacy ciphers (Blowfish,
+    # CAST5, TripleDES, etc.) here, and deprecate the old names
+    from cryptography.hazmat.decrepit.ciphers import \
+        algorithms as decrepit_algorithms
+except ImportError:
+    decrepit_algorithms = None
 from Bcfg2.Utils import safe_input
 from Bcfg2.Server import XMLParser
-from Bcfg2.Compat import md5, b64encode, b64decode, StringIO
+from Bcfg2.Compat import md5
+
+try:
+    # pybase64 is a SIMD-accelerated drop-in replacement for the
+    # base64 functions in the standard library
+    from pybase64 import b64encode
+    from pybase64 import b64decode as _b64decode
+
+    def b64decode(data):
+        """ Decode base64-encoded data with pybase64.  pybase64
+        raises :exc:`binascii.Error` on malformed input, but callers
+        expect :exc:`TypeError` like the standard library raises on
+        Python 2. """
+        try:
+            return _b64decode(data)
+        except binascii.Error:
+            raise TypeError(sys.exc_info()[1])
+except ImportError:
+    from Bcfg2.Compat import b64encode, b64decode
 
 #: Constant representing the encryption operation for
-#: :class:`M2Crypto.EVP.Cipher`, which uses a simple integer.  This
-#: makes our code more readable.
+#: :func:`_cipher_filter`, which uses a simple integer.  This makes
+#: our code more readable.
 ENCRYPT = 1
 
 #: Constant representing the decryption operation for
-#: :class:`M2Crypto.EVP.Cipher`, which uses a simple integer.  This
-#: makes our code more readable.
+#: :func:`_cipher_filter`, which uses a simple integer.  This makes
+#: our code more readable.
 DECRYPT = 0
 
 #: Default initialization vector.  For best security, you should use a
@@ -30,6 +58,51 @@ DECRYPT = 0
 #: automated fashion.
 IV = r'\0' * 16
 
+#: Mapping of the cipher portion of OpenSSL-style algorithm names
+#: (e.g., ``aes_256`` in ``aes_256_cbc``) to a tuple of the name of
+#: the :mod:`cryptography` algorithm class and the key length in
+#: bytes.  The classes are looked up by name only when an algorithm
+#: is used (see :func:`_get_algorithm_class`), so that legacy ciphers
+#: that are deprecated or moved in newer versions of cryptography
+#: don't cause warnings or errors on import.  Single DES is provided
+#: by TripleDES with a single 8-byte key.
+ALGORITHMS = dict(aes_128=("AES", 16),
+                  aes_192=("AES", 24),
+                  aes_256=("AES", 32),
+                  camellia_128=("Camellia", 16),
+                  camellia_192=("Camellia", 24),
+                  camellia_256=("Camellia", 32),
+                  bf=("Blowfish", 16),
+                  cast5=("CAST5", 16),
+                  des=("TripleDES", 8),
+                  des_ede=("TripleDES", 16),
+                  des_ede3=("TripleDES", 24))
+
+#: Mapping of the mode portion of OpenSSL-style algorithm names to a
+#: tuple of the :mod:`cryptography` mode class and whether or not
+#: that mode uses PKCS#7 padding.
+MODES = dict(cbc=(modes.CBC, True),
+             ecb=(modes.ECB, True),
+             cfb=(modes.CFB, False),
+             ofb=(modes.OFB, False),
+             ctr=(modes.CTR, False),
+             gcm=(modes.GCM, False))
+
+#: Mapping of the names of stream ciphers, which have no mode portion,
+#: to a tuple of the name of the :mod:`cryptography` algorithm class
+#: and the key length in bytes.
+STREAM_CIPHERS = dict(rc4=("ARC4", 16))
+
+#: Length of the authentication tag appended to data encrypted in GCM
+#: mode
+GCM_TAG_LENGTH = 16
+
+
+class EVPError(Exception):
+    """ Exception raised when data cannot be encrypted or decrypted
+    with the given algorithm and key.  This keeps the name of the
+    M2Crypto exception it replaces for compatibility. """
+
 
 class _OptionContainer(object):
     """ Container for options loaded at import-time to configure
@@ -49,27 +122,198 @@ class _OptionContainer(object):
 
 Bcfg2.Options.get_parser().add_component(_OptionContainer)
 
-Rand.rand_seed(os.urandom(1024))
 
+#: Cache of cipher factories, keyed by algorithm name.  See
+#: :func:`_get_cipher_factory`.
+_CIPHER_FACTORIES = dict()
+
+
+def _get_algorithm_class(name):
+    """ Get a :mod:`cryptography` cipher algorithm class by name.
+    Legacy ciphers are taken from
+    :mod:`cryptography.hazmat.decrepit.ciphers.algorithms` if it
+    exists, and from
+    :mod:`cryptography.hazmat.primitives.ciphers.algorithms`
+    otherwise.
+
+    :param name: The name of the algorithm class, e.g., ``AES``
+    :type name: string
+    :returns: The algorithm class
+    :raises: :class:`EVPError`, if the algorithm is not available
+    """
+    if (decrepit_algorithms is not None and
+            hasattr(decrepit_algorithms, name)):
+        return getattr(decrepit_algorithms, name)
+    try:
+        return getattr(algorithms, name)
+    except AttributeError:
+        raise EVPError("Cipher algorithm %s is not available" % name)
+
+
+def _get_cipher_factory(algorithm):
+    """ Get a function that creates a
+    :class:`cryptography.hazmat.primitives.ciphers.Cipher` for the
+    given OpenSSL-style algorithm name from a key and IV.  As with
+    OpenSSL, the key and IV are truncated to the lengths the cipher
+    requires; short keys are padded with null bytes.  The algorithm
+    name is only parsed the first time it is seen; after that, the
+    factory is returned from a cache.
 
-def _cipher_filter(cipher, instr):
-    """ M2Crypto reads and writes file-like objects, so this uses
-    StringIO to pass data through it """
-    inbuf = StringIO(instr)
-    outbuf = StringIO()
-    while 1:
-        buf = inbuf.read()
-        if not buf:
-            break
-        outbuf.write(cipher.update(buf))
-    outbuf.write(cipher.final())
-    rv = outbuf.getvalue()
-    inbuf.close()
-    outbuf.close()
-    return rv
+    :param algorithm: The cipher algorithm to use, e.g., ``aes_256_cbc``
+    :type algorithm: string
+    :returns: tuple - (function that takes a key and IV and returns a
+              Cipher, boolean indicating whether or not the data must
+              be padded)
+    :raises: :class:`EVPError`, if the algorithm is not supported
+    """
+    try:
+        return _CIPHER_FACTORIES[algorithm]
+    except KeyError:
+        pass
+
+    if algorithm in STREAM_CIPHERS:
+        alg_name, keylen = STREAM_CIPHERS[algorithm]
+        mode_cls = None
+        padded = False
+    else:
+        try:
+            alg, mode = algorithm.rsplit("_", 1)
+            alg_name, keylen = ALGORITHMS[alg]
+            mode_cls, padded = MODES[mode]
+        except (ValueError, KeyError):
+            raise EVPError("Unsupported cipher algorithm: %s" % algorithm)
+    if mode_cls is modes.GCM and alg_name != "AES":
+        raise EVPError("Unsupported cipher algorithm: %s" % algorithm)
+    alg_cls = _get_algorithm_class(alg_name)
+    if mode_cls is None or mode_cls is modes.ECB:
+        ivlen = None
+    elif mode_cls is modes.GCM:
+        # GCM uses a 96-bit nonce
+        ivlen = 12
+    else:
+        ivlen = alg_cls.block_size // 8
+    backend = default_backend()
+
+    def factory(key, iv):
+        """ Create a Cipher from the given key and IV """
+        if mode_cls is None:
+            cipher_mode = None
+        elif ivlen is None:
+            cipher_mode = mode_cls()
+        else:
+            cipher_mode = mode_cls(iv[:ivlen])
+        return Cipher(alg_cls(key[:keylen].ljust(keylen, "\0")),
+                      cipher_mode, backend=backend)
+
+    _CIPHER_FACTORIES[algorithm] = (factory, padded)
+    return _CIPHER_FACTORIES[algorithm]
+
+
+def _get_cipher(algorithm, key, iv):
+    """ Get a :class:`cryptography.hazmat.primitives.ciphers.Cipher`
+    for the given OpenSSL-style algorithm name, key, and IV.  See
+    :func:`_get_cipher_factory`.
+
+    :param algorithm: The cipher algorithm to use, e.g., ``aes_256_cbc``
+    :type algorithm: string
+    :param key: The key to use
+    :type key: string
+    :param iv: The initialization vector
+    :type iv: string
+    :returns: tuple - (Cipher, boolean indicating whether or not the
+              data must be padded)
+    :raises: :class:`EVPError`, if the algorithm is not supported
+    """
+    factory, padded = _get_cipher_factory(algorithm)
+    return (factory(key, iv), padded)
+
+
+def _cipher_filter(cipher, padded, op, data):
+    """ Encrypt or decrypt data with the given cipher, handling
+    PKCS#7 padding the same way ``openssl enc`` does.  In GCM mode,
+    the authentication tag is appended to the encrypted data, and is
+    verified on decryption.
+
+    :param cipher: The cipher to use, as returned by
+                   :func:`_get_cipher`
+    :type cipher: cryptography.hazmat.primitives.ciphers.Cipher
+    :param padded: Whether or not the data is padded
+    :type padded: bool
+    :param op: :attr:`ENCRYPT` or :attr:`DECRYPT`
+    :type op: int
+    :param data: The data to encrypt or decrypt
+    :type data: string
+    :returns: string - The encrypted or decrypted data
+    :raises: :class:`EVPError`, if the data cannot be encrypted or
+             decrypted
+    """
+    try:
+        if op == ENCRYPT:
+            if padded:
+                padder = PKCS7(cipher.algorithm.block_size).padder()
+                data = padder.update(data) + padder.finalize()
+            ctx = cipher.encryptor()
+            data = ctx.update(data) + ctx.finalize()
+            if isinstance(cipher.mode, modes.GCM):
+                data += ctx.tag
+            return data
+        else:
+            ctx = cipher.decryptor()
+            if isinstance(cipher.mode, modes.GCM):
+                tag = data[-GCM_TAG_LENGTH:]
+                data = data[:-GCM_TAG_LENGTH]
+                data = ctx.update(data) + ctx.finalize_with_tag(tag)
+            else:
+                data = ctx.update(data) + ctx.finalize()
+            if padded:
+                unpadder = PKCS7(cipher.algorithm.block_size).unpadder()
+                data = unpadder.update(data) + unpadder.finalize()
+            return data
+    except ValueError:
+        raise EVPError(str(sys.exc_info()[1]))
+    except InvalidTag:
+        raise EVPError("Authentication tag does not match")
+
+
+def _check_final_block(cipher, padded, data):
+    """ Cheaply determine whether or not data might be decryptable
+    with the given key by decrypting only its final block and
+    checking the PKCS#7 padding.  In CBC mode, the final block can be
+    decrypted by using the previous ciphertext block as the IV.  If
+    the padding is invalid, the full decryption is certain to fail.
+    Stream modes have no padding, so this always succeeds for them.
+
+    :param cipher: The cipher to use, as returned by
+                   :func:`_get_cipher`
+    :type cipher: cryptography.hazmat.primitives.ciphers.Cipher
+    :param padded: Whether or not the data is padded
+    :type padded: bool
+    :param data: The raw binary encrypted data
+    :type data: string
+    :returns: bool - False if the data definitely cannot be decrypted
+    """
+    if not padded:
+        return True
+    block_size = cipher.algorithm.block_size
+    blen = block_size // 8
+    if not data or len(data) % blen:
+        return False
+    if len(data) > blen and isinstance(cipher.mode, modes.CBC):
+        # reuse the keyed algorithm object from the full cipher
+        cipher = Cipher(cipher.algorithm, modes.CBC(data[-2 * blen:-blen]),
+                        backend=default_backend())
+    ctx = cipher.decryptor()
+    unpadder = PKCS7(block_size).unpadder()
+    try:
+        unpadder.update(ctx.update(data[-blen:]) + ctx.finalize())
+        unpadder.finalize()
+    except ValueError:
+        return False
+    return True
 
 
-def str_encrypt(plaintext, key, iv=IV, algorithm=None, salt=None):
+def str_encrypt(plaintext, key, iv=IV, algorithm=None,
+                salt=None):  # pylint: disable=W0613
     """ Encrypt a string with a key.  For a higher-level encryption
     interface, see :func:`ssl_encrypt`.
 
@@ -77,18 +321,28 @@ def str_encrypt(plaintext, key, iv=IV, algorithm=None, salt=None):
     :type plaintext: string
     :param key: The key to encrypt the data with
     :type key: string
-    :param iv: The initialization vector
+    :param iv: The initialization vector.  This must be given
+               explicitly for GCM mode, which is insecure if an IV is
+               ever reused with the same key.
     :type iv: string
     :param algorithm: The cipher algorithm to use
     :type algorithm: string
-    :param salt: The salt to use
+    :param salt: Unused; the key is used as given.  Salting is
+                 handled by :func:`ssl_encrypt`.
     :type salt: string
     :returns: string - The decrypted data
+    :raises: :class:`EVPError`, if the data cannot be encrypted, or
+             if the default IV is used with GCM mode
     """
     if algorithm is None:
         algorithm = Bcfg2.Options.setup.algorithm
-    cipher = Cipher(alg=algorithm, key=key, iv=iv, op=ENCRYPT, salt=salt)
-    return _cipher_filter(cipher, plaintext)
+    cipher, padded = _get_cipher(algorithm, key, iv)
+    if iv is IV and isinstance(cipher.mode, modes.GCM):
+        # reusing a nonce with the same key in GCM mode reveals the
+        # XOR of the plaintexts and allows tags to be forged
+        raise EVPError("%s requires a unique IV for each message" %
+                       algorithm)
+    return _cipher_filter(cipher, padded, ENCRYPT, plaintext)
 
 
 def str_decrypt(crypted, key, iv=IV, algorithm=None):
@@ -107,8 +361,31 @@ def str_decrypt(crypted, key, iv=IV, algorithm=None):
     """
     if algorithm is None:
         algorithm = Bcfg2.Options.setup.algorithm
-    cipher = Cipher(alg=algorithm, key=key, iv=iv, op=DECRYPT)
-    return _cipher_filter(cipher, crypted)
+    cipher, padded = _get_cipher(algorithm, key, iv)
+    return _cipher_filter(cipher, padded, DECRYPT, crypted)
+
+
+def _get_key_iv(passwd, salt):
+    """ Derive the key and initialization vector from a passphrase
+    and salt the same way ``openssl enc`` does.
+
+    :param passwd: The passphrase
+    :type passwd: string
+    :param salt: The salt
+    :type salt: string
+    :returns: tuple - (key, IV)
+    """
+    # this is OpenSSL's EVP_BytesToKey() with MD5 and a single
+    # iteration, which is what ``openssl enc`` uses.  it can't be
+    # swapped for a stronger KDF without breaking compatibility with
+    # openssl and with data that has already been encrypted.
+    pwsalt = passwd + salt
+    # pylint: disable=E1101,E1121
+    h0 = md5(pwsalt).digest()
+    h1 = md5(h0 + pwsalt).digest()
+    h2 = md5(h1 + pwsalt).digest()
+    # pylint: enable=E1101,E1121
+    return (h0 + h1, h2)
 
 
 def ssl_decrypt(data, passwd, algorithm=None):
@@ -129,15 +406,7 @@ def ssl_decrypt(data, passwd, algorithm=None):
     """
     # base64-decode the data
     data = b64decode(data)
-    salt = data[8:16]
-    # pylint: disable=E1101,E1121
-    hashes = [md5(passwd + salt).digest()]
-    for i in range(1, 3):
-        hashes.append(md5(hashes[i - 1] + passwd + salt).digest())
-    # pylint: enable=E1101,E1121
-    key = hashes[0] + hashes[1]
-    iv = hashes[2]
-
+    key, iv = _get_key_iv(passwd, data[8:16])
     return str_decrypt(data[16:], key=key, iv=iv, algorithm=algorithm)
 
 
@@ -158,16 +427,9 @@ def ssl_encrypt(plaintext, passwd, algorithm=None, salt=None):
               compatible with openssl command-line tools.
     """
     if salt is None:
-        salt = Rand.rand_bytes(8)
-
-    # pylint: disable=E1101,E1121
-    hashes = [md5(passwd + salt).digest()]
-    for i in range(1, 3):
-        hashes.append(md5(hashes[i - 1] + passwd + salt).digest())
-    # pylint: enable=E1101,E1121
-    key = hashes[0] + hashes[1]
-    iv = hashes[2]
+        salt = os.urandom(8)
 
+    key, iv = _get_key_iv(passwd, salt)
     crypted = str_encrypt(plaintext, key=key, salt=salt, iv=iv,
                           algorithm=algorithm)
     return b64encode("Salted__" + salt + crypted) + "\n"
@@ -196,13 +458,29 @@ def bruteforce_decrypt(crypted, passphrases=None, algorithm=None):
     :param algorithm: The cipher algorithm to use
     :type algorithm: string
     :returns: string - The decrypted data
-    :raises: :class:`M2Crypto.EVP.EVPError`, if the data cannot be decrypted
+    :raises: :class:`EVPError`, if the data cannot be decrypted
     """
     if passphrases is None:
         passphrases = Bcfg2.Options.setup.passphrases.values()
+    if algorithm is None:
+        algorithm = Bcfg2.Options.setup.algorithm
+    factory, padded = _get_cipher_factory(algorithm)
+    # decode the data and split out the salt once, rather than once
+    # per passphrase
+    data = b64decode(crypted)
+    salt = data[8:16]
+    data = data[16:]
     for passwd in passphrases:
+        key, iv = _get_key_iv(passwd, salt)
+        # build the keyed cipher once, and use it for both the quick
+        # check and the full decryption
+        cipher = factory(key, iv)
+        # skip the full decryption for passphrases that cannot
+        # possibly be right
+        if not _check_final_block(cipher, padded, data):
+            continue
         try:
-            return ssl_decrypt(crypted, passwd, algorithm=algorithm)
+            return _cipher_filter(cipher, padded, DECRYPT, data)
         except EVPError:
             pass
     raise EVPError("Failed to decrypt")
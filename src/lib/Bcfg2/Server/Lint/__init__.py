@@ -1,15 +1,17 @@
 """ Base classes for Lint plugins and error handling """
 
-import copy
 import fcntl
 import fnmatch
 import glob
 import logging
 import os
+import re
+import signal
 import struct
 import sys
 import termios
 import textwrap
+import threading
 import time
 
 import lxml.etree
@@ -18,9 +20,23 @@ import lxml.etree
 import Bcfg2.Options
 import Bcfg2.Server.Core
 import Bcfg2.Server.Plugins
-from Bcfg2.Compat import walk_packages
+from Bcfg2.Compat import walk_packages, Queue, Empty
 from Bcfg2.Options import _debug
 
+#: A cached list of ``(loader, name, is_pkg)`` tuples describing the
+#: lint plugin modules.  Populated by :func:`get_lint_packages`.
+_LINT_PKG_CACHE = None
+
+#: Whitespace characters that :class:`textwrap.TextWrapper` expands
+#: or replaces when wrapping text
+_SPECIAL_WHITESPACE = re.compile(r'[\t\n\x0b\x0c\r]')
+
+#: Sentinel indicating that the terminal size has not been determined
+_UNSET = object()
+
+#: The cached terminal size, as returned by :func:`get_termsize`
+_TERMSIZE_CACHE = _UNSET
+
 
 def _ioctl_GWINSZ(fd):  # pylint: disable=C0103
     """ get a tuple of (height, width) giving the size of the window
@@ -31,8 +47,37 @@ def _ioctl_GWINSZ(fd):  # pylint: disable=C0103
         return None
 
 
+def _reset_termsize(*_):
+    """ Signal handler that clears the cached terminal size when the
+    terminal is resized """
+    global _TERMSIZE_CACHE  # pylint: disable=W0603
+    _TERMSIZE_CACHE = _UNSET
+
+
 def get_termsize():
-    """ get a tuple of (width, height) giving the size of the terminal """
+    """ get a tuple of (width, height) giving the size of the
+    terminal.  The size is only probed once; it is recomputed after
+    the terminal is resized. """
+    global _TERMSIZE_CACHE  # pylint: disable=W0603
+    if _TERMSIZE_CACHE is _UNSET:
+        _TERMSIZE_CACHE = _probe_termsize()
+        try:
+            # don't clobber a handler that somebody else installed
+            if signal.getsignal(signal.SIGWINCH) == signal.SIG_DFL:
+                signal.signal(signal.SIGWINCH, _reset_termsize)
+                # restart system calls that are interrupted by a
+                # resize instead of failing them with EINTR
+                signal.siginterrupt(signal.SIGWINCH, False)
+        except (AttributeError, ValueError):
+            # no SIGWINCH on this platform, or we're not in the main
+            # thread.  either way, we just won't notice resizes.
+            pass
+    return _TERMSIZE_CACHE
+
+
+def _probe_termsize():
+    """ query the terminal for a tuple of (width, height) giving its
+    size """
     if not sys.stdout.isatty():
         return None
     dims = _ioctl_GWINSZ(0) or _ioctl_GWINSZ(1) or _ioctl_GWINSZ(2)
@@ -51,6 +96,16 @@ def get_termsize():
     return int(dims[1]), int(dims[0])
 
 
+def get_lint_packages():
+    """ get a list of ``(loader, name, is_pkg)`` tuples for all lint
+    plugin modules.  Walking the package path is expensive and the
+    result does not change at runtime, so it is only done once. """
+    global _LINT_PKG_CACHE  # pylint: disable=W0603
+    if _LINT_PKG_CACHE is None:
+        _LINT_PKG_CACHE = list(walk_packages(path=__path__))
+    return _LINT_PKG_CACHE
+
+
 class Plugin(object):
     """ Base class for all bcfg2-lint plugins """
 
@@ -84,6 +139,26 @@ class Plugin(object):
             self.errorhandler = errorhandler
         self.errorhandler.RegisterErrors(self.Errors())
 
+    def _get_files(self):
+        """ Get the list of files that bcfg2-lint should be run
+        against """
+        return self._files
+
+    def _set_files(self, files):
+        """ Set the list of files that bcfg2-lint should be run
+        against, and precompute the sets used by
+        :func:`Bcfg2.Server.Lint.Plugin.HandlesFile` """
+        self._files = files
+        if files is None:
+            self._files_set = None
+            self._abs_files_set = None
+        else:
+            self._files_set = frozenset(files)
+            self._abs_files_set = frozenset(os.path.abspath(f)
+                                            for f in files)
+
+    files = property(_get_files, _set_files)
+
     def Run(self):
         """ Run the plugin.  Must be overloaded by child classes. """
         raise NotImplementedError
@@ -104,13 +179,15 @@ class Plugin(object):
         """ Returns True if the given file should be handled by the
         plugin according to :attr:`Bcfg2.Server.Lint.Plugin.files`,
         False otherwise. """
-        return (self.files is None or
-                fname in self.files or
-                os.path.join(Bcfg2.Options.setup.repository,
-                             fname) in self.files or
-                os.path.abspath(fname) in self.files or
+        # checks are ordered from cheapest to most expensive.  joining
+        # an absolute fname to the repository just yields fname, and
+        # abspath() only needs to call getcwd() for relative paths,
+        # so the last check is the only one that may make a syscall.
+        return (self._files_set is None or
+                fname in self._files_set or
                 os.path.abspath(os.path.join(Bcfg2.Options.setup.repository,
-                                             fname)) in self.files)
+                                             fname)) in self._abs_files_set or
+                os.path.abspath(fname) in self._abs_files_set)
 
     def LintError(self, err, msg):
         """ Raise an error from the lint process.
@@ -136,11 +213,16 @@ class Plugin(object):
         """
         xml = None
         if len(element) or element.text:
-            el = copy.copy(element)
-            if el.text and not keep_text:
-                el.text = '...'
-            for child in el.iterchildren():
-                el.remove(child)
+            # build a bare element rather than copying and pruning the
+            # original, which would copy the entire subtree
+            el = lxml.etree.Element(element.tag, attrib=dict(element.attrib),
+                                    nsmap=element.nsmap)
+            if element.text:
+                if keep_text:
+                    el.text = element.text
+                else:
+                    el.text = '...'
+            lxml.etree.cleanup_namespaces(el)
             xml = lxml.etree.tostring(
                 el,
                 xml_declaration=False).decode("UTF-8").strip()
@@ -162,6 +244,15 @@ class Plugin(object):
 class ErrorHandler(object):
     """ A class to handle errors for bcfg2-lint plugins """
 
+    #: A dict of terminal width => :class:`textwrap.TextWrapper`
+    #: objects shared by all error handlers
+    _wrappers = dict()
+
+    #: A list of ``(substring, method name)`` tuples used to map
+    #: error handling actions to handler methods, in order of
+    #: precedence.  Actions that match none of them are silent.
+    _actions = [("warn", "warn"), ("err", "error")]
+
     def __init__(self, errors=None):
         """
         :param errors: An initial dict of errors to register
@@ -177,14 +268,33 @@ class ErrorHandler(object):
 
         termsize = get_termsize()
         if termsize is not None and termsize[0] > 0:
-            twrap = textwrap.TextWrapper(initial_indent="  ",
-                                         subsequent_indent="  ",
-                                         width=termsize[0])
+            if termsize[0] not in self._wrappers:
+                self._wrappers[termsize[0]] = textwrap.TextWrapper(
+                    initial_indent="  ", subsequent_indent="  ",
+                    width=termsize[0])
+            #: The width of the terminal
+            self._width = termsize[0]
+            self._textwrap = self._wrappers[termsize[0]].wrap
             #: A function to wrap text to the width of the terminal
-            self._wrapper = twrap.wrap
+            self._wrapper = self._wrap
         else:
+            self._width = None
             self._wrapper = lambda s: [s]
 
+        #: A cache of error handling action => handler function
+        self._handlers = dict()
+
+        #: Thread-local storage for messages buffered in batch mode.
+        #: Each thread that calls
+        #: :func:`Bcfg2.Server.Lint.ErrorHandler.begin_batch` gets its
+        #: own buffer, so plugins running in parallel don't mix their
+        #: output.
+        self._local = threading.local()
+
+        #: A lock protecting the error and warning counts, and
+        #: ensuring that batches are logged atomically
+        self._lock = threading.Lock()
+
         #: A dict of registered errors
         self.errortypes = dict()
         if errors is not None:
@@ -201,12 +311,22 @@ class ErrorHandler(object):
         """
         for err, action in errors.items():
             if err not in self.errortypes:
-                if "warn" in action:
-                    self.errortypes[err] = self.warn
-                elif "err" in action:
-                    self.errortypes[err] = self.error
-                else:
-                    self.errortypes[err] = self.debug
+                self.errortypes[err] = self._get_handler(action)
+
+    def _get_handler(self, action):
+        """ Get the handler function for the given error handling
+        action ("error", "warning", or "silent").  Actions are
+        resolved only once per error handler. """
+        try:
+            return self._handlers[action]
+        except KeyError:
+            handler = self.debug
+            for substr, name in self._actions:
+                if substr in action:
+                    handler = getattr(self, name)
+                    break
+            self._handlers[action] = handler
+            return handler
 
     def dispatch(self, err, msg):
         """ Dispatch an error to the correct handler.
@@ -219,13 +339,15 @@ class ErrorHandler(object):
         :param msg: The freeform message to display to the end user.
         :type msg: string
         """
-        if err in self.errortypes:
-            self.errortypes[err](msg)
-            self.logger.debug("    (%s)" % err)
+        handler = self.errortypes.get(err)
+        if handler is not None:
+            handler(msg)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self._emit(self.logger.debug, "    (%s)", err)
         else:
             # assume that it's an error, but complain
             self.error(msg)
-            self.logger.warning("Unknown error %s" % err)
+            self._emit(self.logger.warning, "Unknown error %s", err)
 
     def error(self, msg):
         """ Log an error condition.
@@ -233,7 +355,11 @@ class ErrorHandler(object):
         :param msg: The freeform message to display to the end user.
         :type msg: string
         """
-        self.errors += 1
+        self._lock.acquire()
+        try:
+            self.errors += 1
+        finally:
+            self._lock.release()
         self._log(msg, self.logger.error, prefix="ERROR: ")
 
     def warn(self, msg):
@@ -242,7 +368,11 @@ class ErrorHandler(object):
         :param msg: The freeform message to display to the end user.
         :type msg: string
         """
-        self.warnings += 1
+        self._lock.acquire()
+        try:
+            self.warnings += 1
+        finally:
+            self._lock.release()
         self._log(msg, self.logger.warning, prefix="WARNING: ")
 
     def debug(self, msg):
@@ -251,7 +381,81 @@ class ErrorHandler(object):
         :param msg: The freeform message to display to the end user.
         :type msg: string
         """
-        self._log(msg, self.logger.debug)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(msg, self.logger.debug)
+
+    def _get_batch(self):
+        """ Get the list of ``(logfunc, text)`` tuples buffered by the
+        current thread, or None if it is not in batch mode """
+        return getattr(self._local, "batch", None)
+
+    def _set_batch(self, batch):
+        """ Set the list of ``(logfunc, text)`` tuples buffered by the
+        current thread """
+        self._local.batch = batch
+
+    _batch = property(_get_batch, _set_batch)
+
+    def begin_batch(self):
+        """ Start buffering log output in the current thread.
+        Messages are held until
+        :func:`Bcfg2.Server.Lint.ErrorHandler.flush_batch` is called,
+        at which point they are logged together, without output from
+        other threads mixed in.  Error and warning counts are still
+        updated immediately. """
+        if self._batch is None:
+            self._batch = []
+
+    def end_batch(self):
+        """ Stop buffering log output in the current thread, and
+        return the messages buffered since
+        :func:`Bcfg2.Server.Lint.ErrorHandler.begin_batch` was called
+        without logging them.  They can be logged later, from any
+        thread, by passing them to
+        :func:`Bcfg2.Server.Lint.ErrorHandler.flush_batch`.
+
+        :returns: list of ``(logfunc, text)`` tuples
+        """
+        batch = self._batch
+        self._batch = None
+        return batch or []
+
+    def flush_batch(self, batch=None):
+        """ Log all messages buffered since
+        :func:`Bcfg2.Server.Lint.ErrorHandler.begin_batch` was called,
+        and stop buffering.
+
+        :param batch: Log the given messages, as returned by
+                      :func:`Bcfg2.Server.Lint.ErrorHandler.end_batch`,
+                      instead of the ones buffered by the current
+                      thread.  Buffering is not affected.
+        :type batch: list of ``(logfunc, text)`` tuples
+        """
+        if batch is None:
+            batch = self.end_batch()
+        if not batch:
+            return
+        # each message is still logged as its own record, since syslog
+        # and the log file don't split records on newlines
+        self._lock.acquire()
+        try:
+            for logfunc, text in batch:
+                logfunc(text)
+        finally:
+            self._lock.release()
+
+    def _emit(self, logfunc, text, *args):
+        """ Log the given text with the given function, or buffer it
+        if :func:`Bcfg2.Server.Lint.ErrorHandler.begin_batch` has been
+        called.  If ``args`` are given, they are interpolated into
+        ``text`` by the logging system, or immediately if the text is
+        buffered. """
+        if self._batch is None:
+            logfunc(text, *args)
+        elif args:
+            self._batch.append((logfunc, text % args))
+        else:
+            self._batch.append((logfunc, text))
 
     def _log(self, msg, logfunc, prefix=""):
         """ Generic log function that logs a message with the given
@@ -263,16 +467,27 @@ class ErrorHandler(object):
         # lose textwrap's built-in initial indent functionality,
         # because we want to only treat the very first line of the
         # first paragraph specially.  so we do some silliness.
+        #
+        # each line is logged with its own call to logfunc, since
+        # syslog and the log file don't split records on newlines.
         rawlines = msg.splitlines()
         firstline = True
         for rawline in rawlines:
-            lines = self._wrapper(rawline)
-            for line in lines:
+            for line in self._wrapper(rawline):
                 if firstline:
-                    logfunc(prefix + line.lstrip())
+                    self._emit(logfunc, prefix + line.lstrip())
                     firstline = False
                 else:
-                    logfunc(line)
+                    self._emit(logfunc, line)
+
+    def _wrap(self, line):
+        """ Wrap a single line of text to the width of the terminal.
+        Lines that already fit, and that textwrap would not otherwise
+        alter, are indented without calling textwrap. """
+        if (len(line) + 2 <= self._width and line[-1:].strip() and
+                not _SPECIAL_WHITESPACE.search(line)):
+            return ["  " + line]
+        return self._textwrap(line)
 
 
 class ServerlessPlugin(Plugin):  # pylint: disable=W0223
@@ -324,13 +539,14 @@ class LintPluginOption(Bcfg2.Options.Option):
         with enabled server plugins or that has no matching plugin.
         """
 
-        plugins = [p.__name__ for p in namespace.plugins]
-        for loader, name, _is_pkg in walk_packages(path=__path__):
+        plugins = set(p.__name__ for p in namespace.plugins)
+        for _, name, _is_pkg in get_lint_packages():
             try:
-                module_name = 'Bcfg2.Server.Lint.%s' % name
-                module = loader \
-                    .find_module(module_name) \
-                    .load_module(module_name)
+                # use __import__ rather than the loader so that modules
+                # that have already been imported are reused from
+                # sys.modules instead of being executed again
+                module = __import__('Bcfg2.Server.Lint.%s' % name,
+                                    fromlist=[name])
                 plugin = getattr(module, name)
                 if plugin.__serverplugin__ is None or \
                    plugin.__serverplugin__ in plugins:
@@ -352,6 +568,10 @@ class _EarlyOptions(object):
 
 class CLI(object):
     """ The bcfg2-lint CLI """
+
+    #: The maximum number of threads used to run serverless plugins
+    max_threads = 8
+
     options = Bcfg2.Server.Core.Core.options + [
         Bcfg2.Options.PathOption(
             '--lint-config', default='/etc/bcfg2-lint.conf',
@@ -377,17 +597,23 @@ class CLI(object):
 
         self.logger = logging.getLogger(parser.prog)
 
-        self.logger.debug("Running lint with plugins: %s" %
-                          [p.__name__
-                           for p in Bcfg2.Options.setup.lint_plugins])
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Running lint with plugins: %s",
+                              [p.__name__
+                               for p in Bcfg2.Options.setup.lint_plugins])
 
-        if Bcfg2.Options.setup.stdin:
-            self.files = [s.strip() for s in sys.stdin.readlines()]
-        else:
-            self.files = None
         self.errorhandler = self.get_errorhandler()
+        self.files = None
         self.serverlessplugins = []
         self.serverplugins = []
+        if Bcfg2.Options.setup.list_errors:
+            # listing errors only needs the error handler and the
+            # plugin classes, so skip everything else
+            return
+
+        if Bcfg2.Options.setup.stdin:
+            self.files = [line.strip() for line in sys.stdin
+                          if line.strip()]
         for plugin in Bcfg2.Options.setup.lint_plugins:
             if issubclass(plugin, ServerPlugin):
                 self.serverplugins.append(plugin)
@@ -397,8 +623,8 @@ class CLI(object):
     def run(self):
         """ Run bcfg2-lint """
         if Bcfg2.Options.setup.list_errors:
-            for plugin in self.serverplugins + self.serverlessplugins:
-                self.errorhandler.RegisterErrors(getattr(plugin, 'Errors')())
+            for plugin in Bcfg2.Options.setup.lint_plugins:
+                self.errorhandler.RegisterErrors(plugin.Errors())
 
             print("%-35s %-35s" % ("Error name", "Handler"))
             for err, handler in self.errorhandler.errortypes.items():
@@ -446,11 +672,63 @@ class CLI(object):
 
     def run_serverless_plugins(self):
         """ Run serverless plugins """
-        self.logger.debug("Running serverless plugins: %s" %
-                          [p.__name__ for p in self.serverlessplugins])
-        for plugin in self.serverlessplugins:
-            self.logger.debug("  Running %s" % plugin.__name__)
-            plugin(files=self.files, errorhandler=self.errorhandler).Run()
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Running serverless plugins: %s",
+                              [p.__name__ for p in self.serverlessplugins])
+        # serverless plugins are independent of one another, and
+        # spend much of their time parsing XML or waiting on
+        # subprocesses, so they are run in parallel threads.  each
+        # plugin's output is buffered, and logged in plugin order once
+        # they have all finished, so that it doesn't depend on which
+        # threads happen to finish first.
+        queue = Queue()
+        for plugin in enumerate(self.serverlessplugins):
+            queue.put(plugin)
+        results = dict()
+        threads = []
+        for _ in range(min(self.max_threads, len(self.serverlessplugins))):
+            thread = threading.Thread(target=self._run_plugin_queue,
+                                      args=(queue, results))
+            # don't keep the process alive if the main thread is
+            # interrupted
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            # on python 2, join() without a timeout can't be
+            # interrupted, so Ctrl-C would do nothing until every
+            # plugin finished
+            while thread.is_alive():
+                thread.join(1)
+        failures = []
+        for idx, plugin in enumerate(self.serverlessplugins):
+            batch, exc_info = results[idx]
+            self.errorhandler.flush_batch(batch)
+            if exc_info is not None:
+                self.logger.error("Lint plugin %s failed", plugin.__name__,
+                                  exc_info=exc_info)
+                failures.append(exc_info[1])
+        if failures:
+            raise failures[0]
+
+    def _run_plugin_queue(self, queue, results):
+        """ Run serverless plugins from the given queue of ``(index,
+        plugin)`` tuples until it is empty.  For each plugin, a tuple
+        of its buffered output and the exception info if it failed (or
+        None) is stored in ``results``, keyed by its index. """
+        while True:
+            try:
+                idx, plugin = queue.get_nowait()
+            except Empty:
+                return
+            self.logger.debug("  Running %s", plugin.__name__)
+            exc_info = None
+            self.errorhandler.begin_batch()
+            try:
+                self._run_plugin(plugin)
+            except:  # pylint: disable=W0702
+                exc_info = sys.exc_info()
+            results[idx] = (self.errorhandler.end_batch(), exc_info)
 
     def run_server_plugins(self):
         """ run plugins that require a running server to run """
@@ -458,12 +736,12 @@ class CLI(object):
         try:
             core.load_plugins()
             core.block_for_fam_events(handle_events=True)
-            self.logger.debug("Running server plugins: %s" %
-                              [p.__name__ for p in self.serverplugins])
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Running server plugins: %s",
+                                  [p.__name__ for p in self.serverplugins])
             for plugin in self.serverplugins:
-                self.logger.debug("  Running %s" % plugin.__name__)
-                plugin(core,
-                       files=self.files, errorhandler=self.errorhandler).Run()
+                self.logger.debug("  Running %s", plugin.__name__)
+                self._run_plugin(plugin, args=[core])
         finally:
             core.shutdown()
 
@@ -471,10 +749,13 @@ class CLI(object):
         """ Run a single bcfg2-lint plugin """
         if args is None:
             args = []
-        start = time.time()
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            start = time.time()
         # python 2.5 doesn't support mixing *magic and keyword arguments
         kwargs = dict(files=self.files, errorhandler=self.errorhandler)
         rv = plugin(*args, **kwargs).Run()
-        self.logger.debug("  Ran %s in %0.2f seconds" % (plugin.__name__,
-                                                         time.time() - start))
+        if debug:
+            self.logger.debug("  Ran %s in %0.2f seconds", plugin.__name__,
+                              time.time() - start)
         return rv
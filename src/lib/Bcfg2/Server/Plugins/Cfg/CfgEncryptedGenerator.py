@@ -25,7 +25,7 @@ class CfgEncryptedGenerator(CfgGenerator):
     def __init__(self, fname, spec):
         CfgGenerator.__init__(self, fname, spec)
         if not HAS_CRYPTO:
-            raise PluginExecutionError("M2Crypto is not available")
+            raise PluginExecutionError("python-cryptography is not available")
 
     def handle_event(self, event):
         CfgGenerator.handle_event(self, event)
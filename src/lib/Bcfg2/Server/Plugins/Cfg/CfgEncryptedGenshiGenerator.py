@@ -40,4 +40,4 @@ class CfgEncryptedGenshiGenerator(CfgGenshiGenerator):
     def __init__(self, fname, spec):
         CfgGenshiGenerator.__init__(self, fname, spec)
         if not HAS_CRYPTO:
-            raise PluginExecutionError("M2Crypto is not available")
+            raise PluginExecutionError("python-cryptography is not available")
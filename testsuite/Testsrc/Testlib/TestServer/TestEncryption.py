@@ -30,7 +30,7 @@ baz
 """ + "a" * 16384  # 16K is completely arbitrary
     iv = "0123456789ABCDEF"
     salt = "01234567"
-    algo = "des_cbc"
+    algo = "aes_256_gcm"
 
     @skipUnless(HAS_CRYPTO, "Encryption libraries not found")
     def setUp(self):
@@ -53,8 +53,8 @@ baz
                                      algorithm=self.algo))
 
         # test that different algorithms are actually used
-        self.assertNotEqual(str_encrypt(self.plaintext, key),
-                            str_encrypt(self.plaintext, key,
+        self.assertNotEqual(str_encrypt(self.plaintext, key, iv=self.iv),
+                            str_encrypt(self.plaintext, key, iv=self.iv,
                                         algorithm=self.algo))
 
         # test that different keys are actually used
@@ -66,11 +66,34 @@ baz
                             str_encrypt(self.plaintext, key))
 
         # test that errors are raised on bad decrypts
-        crypted = str_encrypt(self.plaintext, key, algorithm=self.algo)
+        crypted = str_encrypt(self.plaintext, key, iv=self.iv,
+                              algorithm=self.algo)
         self.assertRaises(EVPError, str_decrypt,
-                          crypted, "bogus key", algorithm=self.algo)
+                          crypted, "bogus key", iv=self.iv,
+                          algorithm=self.algo)
         self.assertRaises(EVPError, str_decrypt,
-                          crypted, key)  # bogus algorithm
+                          crypted, key, iv=self.iv)  # bogus algorithm
+
+    def test_str_encrypt_gcm_default_iv(self):
+        """ test that str_encrypt refuses the default IV in GCM mode """
+        key = "a simple key"
+        self.assertRaises(EVPError, str_encrypt,
+                          self.plaintext, key, algorithm="aes_256_gcm")
+        self.assertRaises(EVPError, str_encrypt,
+                          self.plaintext, key, iv=IV,
+                          algorithm="aes_128_gcm")
+
+        # other modes still allow the default IV
+        crypted = str_encrypt(self.plaintext, key, algorithm="aes_256_cbc")
+        self.assertEqual(self.plaintext,
+                         str_decrypt(crypted, key, algorithm="aes_256_cbc"))
+
+        # and GCM works with an explicit IV
+        crypted = str_encrypt(self.plaintext, key, iv=self.iv,
+                              algorithm="aes_256_gcm")
+        self.assertEqual(self.plaintext,
+                         str_decrypt(crypted, key, iv=self.iv,
+                                     algorithm="aes_256_gcm"))
 
     def test_ssl_crypt(self):
         """ test ssl_encrypt/ssl_decrypt """
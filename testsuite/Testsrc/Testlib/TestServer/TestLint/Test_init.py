@@ -0,0 +1,272 @@
+import os
+import sys
+import threading
+from mock import Mock, call, patch, ANY
+from Bcfg2.Server.Lint import ErrorHandler, CLI
+
+# add all parent testsuite directories to sys.path to allow (most)
+# relative imports in python 2.4
+path = os.path.dirname(__file__)
+while path != "/":
+    if os.path.basename(path).lower().startswith("test"):
+        sys.path.append(path)
+    if os.path.basename(path) == "testsuite":
+        break
+    path = os.path.dirname(path)
+from common import *
+
+# the real Thread class, for use while threading.Thread is patched
+Thread = threading.Thread
+
+
+@patch("Bcfg2.Server.Lint.get_termsize", Mock(return_value=None))
+def get_errorhandler(errors=None):
+    """ get an ErrorHandler that doesn't wrap its output and logs to
+    a mock logger """
+    eh = ErrorHandler(errors=errors)
+    eh.logger = Mock()
+    return eh
+
+
+class TestErrorHandler(Bcfg2TestCase):
+    def get_obj(self, errors=None):
+        return get_errorhandler(errors=errors)
+
+    def get_log_calls(self, eh):
+        """ get the calls to the logging functions on the mock logger,
+        in order """
+        return [c for c in eh.logger.method_calls
+                if c[0] in ["error", "warning", "info", "debug"]]
+
+    def test_flush_batch(self):
+        eh = self.get_obj()
+        eh.begin_batch()
+        eh.warn("a")
+        eh.warn("b")
+        eh.error("c")
+        eh.warn("d")
+        eh.warn("e")
+
+        # nothing is logged until the batch is flushed, but the counts
+        # are updated immediately
+        self.assertEqual(self.get_log_calls(eh), [])
+        self.assertEqual(eh.errors, 1)
+        self.assertEqual(eh.warnings, 4)
+
+        # order is kept, and each message is logged separately
+        eh.flush_batch()
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.warning("WARNING: a"),
+                          call.warning("WARNING: b"),
+                          call.error("ERROR: c"),
+                          call.warning("WARNING: d"),
+                          call.warning("WARNING: e")])
+
+        # flushing ends batch mode
+        eh.logger.reset_mock()
+        eh.warn("f")
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.warning("WARNING: f")])
+
+        # flushing with nothing buffered logs nothing
+        eh.logger.reset_mock()
+        eh.begin_batch()
+        eh.flush_batch()
+        eh.flush_batch()
+        self.assertEqual(self.get_log_calls(eh), [])
+
+    def test_end_batch(self):
+        eh = self.get_obj()
+        self.assertEqual(eh.end_batch(), [])
+
+        eh.begin_batch()
+        eh.warn("a")
+        eh.error("b")
+        batch = eh.end_batch()
+
+        # ending the batch logs nothing, and ends batch mode
+        self.assertEqual(self.get_log_calls(eh), [])
+        eh.warn("c")
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.warning("WARNING: c")])
+
+        # the batch can be logged later, without affecting a batch
+        # that is in progress
+        eh.logger.reset_mock()
+        eh.begin_batch()
+        eh.warn("d")
+        eh.flush_batch(batch)
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.warning("WARNING: a"),
+                          call.error("ERROR: b")])
+        eh.logger.reset_mock()
+        eh.flush_batch()
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.warning("WARNING: d")])
+
+    def test_batch_per_thread(self):
+        eh = self.get_obj()
+        eh.begin_batch()
+        eh.warn("main")
+
+        def batched():
+            eh.begin_batch()
+            eh.error("thread")
+            eh.flush_batch()
+
+        thread = threading.Thread(target=batched)
+        thread.start()
+        thread.join()
+
+        # the other thread's flush only logs its own messages
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.error("ERROR: thread")])
+
+        # a thread that isn't batching logs immediately, even while
+        # another thread is batching
+        eh.logger.reset_mock()
+        thread = threading.Thread(target=eh.warn, args=("unbatched",))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.warning("WARNING: unbatched")])
+
+        eh.logger.reset_mock()
+        eh.flush_batch()
+        self.assertEqual(self.get_log_calls(eh),
+                         [call.warning("WARNING: main")])
+
+    def test_concurrent_counts(self):
+        eh = self.get_obj()
+        count = 200
+
+        def report():
+            eh.begin_batch()
+            for i in range(count):
+                eh.error("error %d" % i)
+                eh.warn("warning %d" % i)
+            eh.flush_batch()
+
+        threads = [threading.Thread(target=report) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(eh.errors, 8 * count)
+        self.assertEqual(eh.warnings, 8 * count)
+
+
+class TestCLI(Bcfg2TestCase):
+    test_obj = CLI
+
+    def get_obj(self, plugins):
+        # bypass __init__, which parses the command line
+        cli = self.test_obj.__new__(self.test_obj)
+        cli.logger = Mock()
+        cli.files = None
+        cli.serverlessplugins = plugins
+        cli.serverplugins = []
+        cli.errorhandler = get_errorhandler()
+        return cli
+
+    def get_plugin(self, name, ran, errors=0, warnings=0, exc=None):
+        """ get a fake serverless lint plugin class that reports the
+        given number of errors and warnings, and optionally raises
+        an exception.  The name of the plugin is appended to ``ran``
+        when it is run. """
+        class FakePlugin(object):
+            def __init__(self, files=None, errorhandler=None):
+                self.errorhandler = errorhandler
+
+            def Run(self):
+                for i in range(errors):
+                    self.errorhandler.error("%s error %d" % (name, i))
+                for i in range(warnings):
+                    self.errorhandler.warn("%s warning %d" % (name, i))
+                ran.append(name)
+                if exc is not None:
+                    raise exc
+
+        FakePlugin.__name__ = name
+        return FakePlugin
+
+    def test_run_serverless_plugins(self):
+        ran = []
+        plugins = [self.get_plugin("Plugin%d" % i, ran, errors=i,
+                                   warnings=50)
+                   for i in range(20)]
+        cli = self.get_obj(plugins)
+        cli.run_serverless_plugins()
+        self.assertItemsEqual(ran, [p.__name__ for p in plugins])
+        self.assertEqual(cli.errorhandler.errors, sum(range(20)))
+        self.assertEqual(cli.errorhandler.warnings, 20 * 50)
+
+        # output is logged in plugin order, not in the order that the
+        # plugins finished
+        expected = []
+        for i in range(20):
+            expected.extend(call.error("ERROR: Plugin%d error %d" % (i, j))
+                            for j in range(i))
+            expected.extend(
+                call.warning("WARNING: Plugin%d warning %d" % (i, j))
+                for j in range(50))
+        self.assertEqual([c for c in cli.errorhandler.logger.method_calls
+                          if c[0] in ["error", "warning"]],
+                         expected)
+
+        # no plugins
+        cli = self.get_obj([])
+        cli.run_serverless_plugins()
+
+    def test_run_serverless_plugins_failure(self):
+        ran = []
+        first = ValueError("first")
+        plugins = [self.get_plugin("Good1", ran, warnings=1),
+                   self.get_plugin("Bad1", ran, exc=first),
+                   self.get_plugin("Good2", ran, errors=1),
+                   self.get_plugin("Bad2", ran, exc=KeyError("second")),
+                   self.get_plugin("Good3", ran, warnings=1)]
+
+        for max_threads in [1, 5]:
+            # every plugin runs, and the first failure in plugin order
+            # is re-raised in the main thread, no matter how many
+            # threads are used
+            del ran[:]
+            cli = self.get_obj(plugins)
+            cli.max_threads = max_threads
+            try:
+                cli.run_serverless_plugins()
+            except ValueError:
+                self.assertTrue(sys.exc_info()[1] is first)
+            else:
+                self.fail("Plugin failure was not re-raised")
+            self.assertItemsEqual(ran, [p.__name__ for p in plugins])
+            self.assertEqual(cli.errorhandler.errors, 1)
+            self.assertEqual(cli.errorhandler.warnings, 2)
+            self.assertEqual(
+                cli.logger.error.call_args_list,
+                [call("Lint plugin %s failed", "Bad1", exc_info=ANY),
+                 call("Lint plugin %s failed", "Bad2", exc_info=ANY)])
+            self.assertTrue(
+                cli.logger.error.call_args_list[0][1]['exc_info'][1] is
+                first)
+
+    @patch("threading.Thread")
+    def test_run_serverless_plugins_threads(self, mock_Thread):
+        # worker threads don't keep the process alive, and are waited
+        # on with a timeout so that the main thread can be interrupted
+        cli = self.get_obj([self.get_plugin("Plugin", [])])
+        threads = []
+
+        def get_thread(*args, **kwargs):
+            thread = Thread(*args, **kwargs)
+            thread.join = Mock(wraps=thread.join)
+            threads.append(thread)
+            return thread
+
+        mock_Thread.side_effect = get_thread
+        cli.run_serverless_plugins()
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].daemon)
+        for join_call in threads[0].join.call_args_list:
+            self.assertTrue(join_call[0] or join_call[1])
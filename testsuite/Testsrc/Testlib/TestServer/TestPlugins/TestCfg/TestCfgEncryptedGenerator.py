@@ -22,7 +22,7 @@ from TestServer.TestPlugins.TestCfg.Test_init import TestCfgGenerator
 class TestCfgEncryptedGenerator(TestCfgGenerator):
     test_obj = CfgEncryptedGenerator
 
-    @skipUnless(HAS_CRYPTO, "M2Crypto is not available")
+    @skipUnless(HAS_CRYPTO, "Encryption libraries not found")
     def setUp(self):
         TestCfgGenerator.setUp(self)
 
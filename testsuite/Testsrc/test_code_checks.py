@@ -40,15 +40,15 @@ contingent_checks = {
     ("genshi",): {"lib/Bcfg2/Server/Plugins/Cfg": ["CfgGenshiGenerator.py"]},
     ("Cheetah",): {"lib/Bcfg2/Server/Plugins/Cfg": ["CfgCheetahGenerator.py"]},
     ("jinja2",): {"lib/Bcfg2/Server/Plugins/Cfg": ["CfgJinja2Generator.py"]},
-    ("M2Crypto",): {"lib/Bcfg2": ["Encryption.py"],
-                    "lib/Bcfg2/Server/Plugins/Cfg":
-                        ["CfgEncryptedGenerator.py"]},
-    ("M2Crypto", "genshi"): {"lib/Bcfg2/Server/Plugins/Cfg":
-                                 ["CfgEncryptedGenshiGenerator.py"]},
-    ("M2Crypto", "Cheetah"): {"lib/Bcfg2/Server/Plugins/Cfg":
-                                  ["CfgEncryptedCheetahGenerator.py"]},
-    ("M2Crypto", "jinja2"): {"lib/Bcfg2/Server/Plugins/Cfg":
-                                  ["CfgEncryptedJinja2Generator.py"]},
+    ("cryptography",): {"lib/Bcfg2": ["Encryption.py"],
+                        "lib/Bcfg2/Server/Plugins/Cfg":
+                            ["CfgEncryptedGenerator.py"]},
+    ("cryptography", "genshi"): {"lib/Bcfg2/Server/Plugins/Cfg":
+                                     ["CfgEncryptedGenshiGenerator.py"]},
+    ("cryptography", "Cheetah"): {"lib/Bcfg2/Server/Plugins/Cfg":
+                                      ["CfgEncryptedCheetahGenerator.py"]},
+    ("cryptography", "jinja2"): {"lib/Bcfg2/Server/Plugins/Cfg":
+                                     ["CfgEncryptedJinja2Generator.py"]},
     ("mercurial",): {"lib/Bcfg2/Server/Plugins": ["Hg.py"]},
     ("guppy",): {"lib/Bcfg2/Server/Plugins": ["Guppy.py"]},
     ("boto",): {"lib/Bcfg2/Server/Plugins": ["AWSTags.py"]},
@@ -31,16 +31,12 @@ else
             google_compute_engine
 
         if [[ $PYVER == "2.6" ]]; then
-            pip install \
-                --global-option='build_ext' \
-                --global-option='--include-dirs=/usr/include/x86_64-linux-gnu' \
-                m2crypto
-
-            pip_wheel 'django<1.7' 'South<0.8' 'mercurial<4.3' cheetah guppy \
-                'pycparser<2.19' python-augeas 'PyYAML<5.1'
+            pip_wheel 'cryptography<2.2' 'django<1.7' 'South<0.8' \
+                'mercurial<4.3' cheetah guppy 'pycparser<2.19' python-augeas \
+                'PyYAML<5.1'
         else
             if [[ $PYVER == "2.7" ]]; then
-                pip_wheel m2crypto guppy
+                pip_wheel 'cryptography<3.4' guppy
             fi
 
             pip_wheel django mercurial cheetah3 python-augeas PyYAML
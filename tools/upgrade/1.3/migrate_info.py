@@ -4,6 +4,7 @@ import os
 import re
 import sys
 import lxml.etree
+import multiprocessing
 import Bcfg2.Options
 
 INFO_REGEX = re.compile(r'owner:\s*(?P<owner>\S+)|' +
@@ -19,24 +20,37 @@ INFO_REGEX = re.compile(r'owner:\s*(?P<owner>\S+)|' +
 
 PERMS_REGEX = re.compile(r'perms:\s*(?P<perms>\w+)')
 
+INFO_FILES = frozenset([":info", "info"])
+
 
 def convert(info_file):
     info_xml = os.path.join(os.path.dirname(info_file), "info.xml")
-    if os.path.exists(info_xml):
-        print("%s already exists, not converting %s" % (info_xml, info_file))
-        return
     print("Converting %s to %s" % (info_file, info_xml))
+    attrs = dict()
+    infile = open(info_file)
+    try:
+        for line in infile:
+            match = INFO_REGEX.match(line) or PERMS_REGEX.match(line)
+            if match:
+                # each alternative in the regexes captures exactly one
+                # named group, so there's no need to build a groupdict
+                attrs[match.lastgroup] = match.group(match.lastgroup)
+    finally:
+        infile.close()
+
+    # set all of the attributes at once when the element is created
     fileinfo = lxml.etree.Element("FileInfo")
-    info = lxml.etree.SubElement(fileinfo, "Info")
-    for line in open(info_file).readlines():
-        match = INFO_REGEX.match(line) or PERMS_REGEX.match(line)
-        if match:
-            mgd = match.groupdict()
-            for key, value in list(mgd.items()):
-                if value:
-                    info.set(key, value)
-
-    open(info_xml, "w").write(lxml.etree.tostring(fileinfo, pretty_print=True))
+    info = lxml.etree.SubElement(fileinfo, "Info", attrib=attrs)
+
+    # the document is always the same two elements, so lay out the
+    # whitespace by hand rather than making libxml2 pretty-print it.
+    # the output is still readable for humans who edit it later.
+    fileinfo.text = "\n  "
+    info.tail = "\n"
+    fileinfo.tail = "\n"
+    # let libxml2 write the file directly instead of serializing to a
+    # string first
+    lxml.etree.ElementTree(fileinfo).write(info_xml, xml_declaration=False)
     os.unlink(info_file)
 
 
@@ -47,6 +61,7 @@ def main():
                         Bcfg2.Options.Common.plugins])
     parser.parse()
 
+    info_files = []
     for plugin in Bcfg2.Options.setup.plugins:
         plugin_name = plugin.__name__
         if plugin_name not in ['SSLCA', 'Cfg', 'TGenshi', 'TCheetah',
@@ -54,9 +69,33 @@ def main():
             continue
         datastore = os.path.join(Bcfg2.Options.setup.repository, plugin_name)
         for root, dirs, files in os.walk(datastore):
-            for fname in files:
-                if fname in [":info", "info"]:
-                    convert(os.path.join(root, fname))
+            # decide which file to convert from the directory listing
+            # os.walk() has already done, rather than stat()ing
+            # info.xml for each info file
+            dir_files = [fname for fname in files if fname in INFO_FILES]
+            if not dir_files:
+                continue
+            if "info.xml" in files:
+                for fname in dir_files:
+                    print("%s already exists, not converting %s" %
+                          (os.path.join(root, "info.xml"),
+                           os.path.join(root, fname)))
+                continue
+            # only one info file per directory can be converted
+            info_files.append(os.path.join(root, dir_files[0]))
+            for fname in dir_files[1:]:
+                print("%s will be converted, not converting %s" %
+                      (os.path.join(root, dir_files[0]),
+                       os.path.join(root, fname)))
+
+    # each file is converted independently, so spread them across
+    # all CPUs
+    pool = multiprocessing.Pool()
+    try:
+        pool.map(convert, info_files)
+    finally:
+        pool.close()
+        pool.join()
 
 
 if __name__ == '__main__':